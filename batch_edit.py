@@ -0,0 +1,286 @@
+"""
+Batch edits for Pequitopah: manual overrides, preferences and queue moves
+validated together, applied in memory and persisted with a single write.
+
+Usable from the app (Configurações > Lote) and from the command line:
+
+    python batch_edit.py mudancas.csv [--dry-run] [--days 20]
+
+Accepted input is a JSON list of objects or a CSV with a header row, using the
+columns/keys: op, date, person, avoid, position.
+
+    op=override    date=2025-10-20  person=Chris     (empty person clears the override)
+    op=preference  person=Pavel     avoid=Ter;Sex    (names Seg..Sex or numbers 0..4)
+    op=move        person=Alan      position=1       (1-based position in the queue)
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from datetime import datetime, date
+from typing import List, Dict, Any, Optional
+
+from pequitopah_core import (
+    CURRENT_QUEUE_FILE, DAILY_ASSIGNMENTS_FILE, PREFERENCES_FILE, ROTATION_STATE_FILE,
+    DAY_NAMES_PT, DAY_NAMES_PT_SHORT,
+    load_current_queue, load_daily_assignments, load_preferences, load_rotation_state,
+    rotation_state_payload, safe_save_json_many,
+    get_next_weekday, is_weekday, simulate_schedule,
+    anchor_offset_for, move_person,
+)
+
+BATCH_OPS = ("override", "preference", "move")
+BATCH_COLUMNS = ["op", "date", "person", "avoid", "position"]
+NOBODY = "Ninguém"  # same marker the Agenda "skip day" button writes
+
+class BatchError(ValueError):
+    """
+    Raised when one or more batch entries are invalid; nothing is applied.
+    """
+    def __init__(self, errors: List[str]):
+        super().__init__("\n".join(errors))
+        self.errors = errors
+
+# ---------------------------------------------------------------------
+# Parsing
+# ---------------------------------------------------------------------
+def decode_batch_bytes(data: bytes) -> str:
+    """
+    UTF-8 (with or without BOM), falling back to cp1252 as saved by pt-BR Excel.
+    """
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        pass
+    try:
+        return data.decode("cp1252")
+    except UnicodeDecodeError:
+        raise BatchError(["Não foi possível ler o arquivo: codificação desconhecida (use UTF-8)."])
+
+def parse_batch_json(text: str) -> List[Dict[str, Any]]:
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise BatchError([f"JSON inválido: {e}"])
+    if isinstance(data, dict) and isinstance(data.get("changes"), list):
+        data = data["changes"]
+    if not isinstance(data, list) or not all(isinstance(x, dict) for x in data):
+        raise BatchError(["JSON deve ser uma lista de objetos (ou {\"changes\": [...]})."])
+    return data
+
+def parse_batch_csv(text: str) -> List[Dict[str, Any]]:
+    reader = csv.DictReader(io.StringIO(text))
+    if reader.fieldnames is None:
+        return []
+    unknown = [c for c in reader.fieldnames if c and c.strip() not in BATCH_COLUMNS]
+    if unknown:
+        raise BatchError([f"Colunas desconhecidas no CSV: {', '.join(unknown)}"])
+    rows: List[Dict[str, Any]] = []
+    errors: List[str] = []
+    for r in reader:
+        if None in r:  # DictReader puts cells beyond the header under the None key
+            errors.append(f"linha {reader.line_num}: mais valores que colunas (vírgula sem aspas?)")
+            continue
+        row = {k.strip(): (v or "").strip() for k, v in r.items() if k}
+        if any(row.values()):
+            rows.append(row)
+    if errors:
+        raise BatchError(errors)
+    return rows
+
+def parse_batch(text: str, filename: str = "") -> List[Dict[str, Any]]:
+    """
+    Pick the parser by extension; without one, JSON is tried when the text looks like JSON.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".json" or (ext != ".csv" and text.lstrip()[:1] in ("[", "{")):
+        return parse_batch_json(text)
+    return parse_batch_csv(text)
+
+# ---------------------------------------------------------------------
+# Field normalization
+# ---------------------------------------------------------------------
+def _parse_date(value: Any) -> date:
+    s = str(value or "").strip()
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"data inválida '{s}' (use AAAA-MM-DD ou DD/MM/AAAA)")
+
+def _parse_avoid(value: Any) -> List[int]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        items: List[Any] = [x.strip() for x in value.replace(",", ";").split(";") if x.strip()]
+    elif isinstance(value, list):
+        items = value
+    else:
+        raise ValueError("'avoid' deve ser uma lista ou texto separado por ';'")
+    days: List[int] = []
+    for item in items:
+        if isinstance(item, int) and not isinstance(item, bool):
+            d = item
+        elif isinstance(item, str) and item.isdigit():
+            d = int(item)
+        elif isinstance(item, str) and item.capitalize() in DAY_NAMES_PT_SHORT:
+            d = DAY_NAMES_PT_SHORT.index(item.capitalize())
+        else:
+            raise ValueError(f"dia inválido '{item}' (use Seg..Sex ou 0..4)")
+        if not 0 <= d <= 4:
+            raise ValueError(f"dia inválido '{item}' (use Seg..Sex ou 0..4)")
+        if d not in days:
+            days.append(d)
+    return sorted(days)
+
+def _parse_position(value: Any, queue_len: int) -> int:
+    try:
+        pos = int(str(value).strip())
+    except (TypeError, ValueError):
+        raise ValueError(f"posição inválida '{value}'")
+    if not 1 <= pos <= queue_len:
+        raise ValueError(f"posição {pos} fora da fila (1..{queue_len})")
+    return pos
+
+# ---------------------------------------------------------------------
+# Validate + apply
+# ---------------------------------------------------------------------
+def apply_batch(
+    changes: List[Dict[str, Any]],
+    current_queue: List[str],
+    daily_assignments: Dict[str, str],
+    preferences: Dict[str, List[int]],
+    rotation_offset: int
+) -> Dict[str, Any]:
+    """
+    Validate and apply every change, in order, to copies of the given state.
+    - every entry is checked before anything is returned; any error raises BatchError,
+    - queue moves realign the anchor once at the end, like the Fila tab does,
+    - the result lists in 'changed' only the files that actually need rewriting.
+    """
+    queue = current_queue.copy()
+    assignments = dict(daily_assignments)
+    prefs = {k: list(v) for k, v in preferences.items()}
+    errors: List[str] = []
+
+    for i, change in enumerate(changes, start=1):
+        op = str(change.get("op") or "").strip().lower()
+        person = str(change.get("person") or "").strip()
+        try:
+            if op not in BATCH_OPS:
+                raise ValueError(f"operação desconhecida '{op}' (use {', '.join(BATCH_OPS)})")
+
+            if op == "override":
+                d = _parse_date(change.get("date"))
+                if not is_weekday(d):
+                    raise ValueError(f"{d.strftime('%d/%m/%Y')} não é dia útil")
+                ds = d.strftime("%Y-%m-%d")
+                if not person:
+                    assignments.pop(ds, None)
+                elif person in queue or person == NOBODY:
+                    assignments[ds] = person
+                else:
+                    raise ValueError(f"'{person}' não está na fila")
+
+            elif op == "preference":
+                if person not in queue:
+                    raise ValueError(f"'{person}' não está na fila")
+                prefs[person] = _parse_avoid(change.get("avoid"))
+
+            elif op == "move":
+                if person not in queue:
+                    raise ValueError(f"'{person}' não está na fila")
+                pos = _parse_position(change.get("position"), len(queue))
+                queue = move_person(queue, person, pos - 1)
+        except ValueError as e:
+            errors.append(f"#{i} ({op or '?'}): {e}")
+
+    if errors:
+        raise BatchError(errors)
+
+    new_offset = anchor_offset_for(queue) if queue != current_queue else rotation_offset
+
+    changed: List[str] = []
+    if queue != current_queue:
+        changed.append(CURRENT_QUEUE_FILE)
+    if assignments != daily_assignments:
+        changed.append(DAILY_ASSIGNMENTS_FILE)
+    if prefs != preferences:
+        changed.append(PREFERENCES_FILE)
+    if new_offset != rotation_offset:
+        changed.append(ROTATION_STATE_FILE)
+
+    return {
+        "current_queue": queue,
+        "daily_assignments": assignments,
+        "preferences": prefs,
+        "rotation_offset": new_offset,
+        "changed": changed,
+    }
+
+def save_batch_result(result: Dict[str, Any]) -> None:
+    """
+    Persist the files touched by apply_batch in one write (see safe_save_json_many).
+    """
+    payloads = {
+        CURRENT_QUEUE_FILE: result["current_queue"],
+        DAILY_ASSIGNMENTS_FILE: result["daily_assignments"],
+        PREFERENCES_FILE: result["preferences"],
+        ROTATION_STATE_FILE: rotation_state_payload(result["rotation_offset"]),
+    }
+    to_write = {path: payloads[path] for path in result["changed"]}
+    if to_write:
+        safe_save_json_many(to_write)
+
+# ---------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Aplica em lote overrides, preferências e mudanças de fila.")
+    parser.add_argument("path", help="arquivo .csv ou .json ('-' para ler do stdin)")
+    parser.add_argument("--dry-run", action="store_true", help="valida e mostra a agenda sem gravar")
+    parser.add_argument("--days", type=int, default=10, help="dias da agenda a mostrar (padrão: 10)")
+    args = parser.parse_args(argv)
+
+    if args.path == "-":
+        raw, name = sys.stdin.buffer.read(), ""
+    else:
+        try:
+            with open(args.path, "rb") as f:
+                raw, name = f.read(), args.path
+        except OSError as e:
+            print(f"Não foi possível ler '{args.path}': {e.strerror or e}", file=sys.stderr)
+            return 1
+
+    queue = load_current_queue()
+    assignments = load_daily_assignments()
+    prefs = load_preferences()
+    offset = load_rotation_state(queue)
+
+    try:
+        changes = parse_batch(decode_batch_bytes(raw), name)
+        result = apply_batch(changes, queue, assignments, prefs, offset)
+    except BatchError as e:
+        print("Lote rejeitado, nada foi gravado:", file=sys.stderr)
+        for err in e.errors:
+            print(f"  {err}", file=sys.stderr)
+        return 1
+
+    if not args.dry_run:
+        save_batch_result(result)
+    status = "validado (dry-run)" if args.dry_run else "aplicado"
+    changed = ", ".join(result["changed"]) or "nenhum arquivo"
+    print(f"{len(changes)} mudança(s) {status}; arquivos: {changed}")
+
+    start = get_next_weekday(datetime.now().date())
+    schedule = simulate_schedule(start, max(1, args.days), result["current_queue"], result["daily_assignments"],
+                                 result["preferences"], result["rotation_offset"])
+    for d, p in schedule:
+        print(f"  {d.strftime('%d/%m')} {DAY_NAMES_PT[d.weekday()]:<8} {p}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
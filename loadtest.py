@@ -0,0 +1,485 @@
+"""
+Local multi-session load test for the Pequitopah Streamlit app.
+
+Drives many simulated browser sessions through streamlit_app.py with Streamlit's
+AppTest, all against JSON state files in a scratch directory, and reports:
+- p50/p99 rerun latency (overall and per action) and throughput,
+- write contention on the JSON files (overlapping writes, max concurrent writers, failed writes),
+- lost updates: overrides/preferences that a session saved but the final files no longer hold,
+  today's manual (✓) choice checked last-writer-wins, and pass-turn/skip-day offset changes
+  overwritten by a session working from a stale offset.
+
+Writes go through the app's own buttons (⏭, 🚫, the ✓ manual choice for today) and the
+Lote tab (future-dated overrides, preferences). AppTest cannot edit st.data_editor, so
+the 💾 preference grid is not driven; preferences are only exercised through Lote.
+
+AppTest keeps a process-wide runtime, so concurrency comes from worker processes;
+each worker owns a slice of the sessions and drives them round-robin.
+
+    python loadtest.py --sessions 50 --workers 8 --actions 10
+    python loadtest.py --cache session reload --storage /tmp /dev/shm --json resultado.json
+"""
+import argparse
+import itertools
+import json
+import logging
+import math
+import multiprocessing as mp
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Tuple, Optional
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(APP_DIR, "streamlit_app.py")
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+from pequitopah_core import (  # noqa: E402
+    ORIGINAL_QUEUE, DAY_NAMES_PT_SHORT,
+    CURRENT_QUEUE_FILE, DAILY_ASSIGNMENTS_FILE, PREFERENCES_FILE, ROTATION_STATE_FILE,
+    is_weekday, get_next_weekday, anchor_offset_for,
+)
+
+ACTIONS = ("read", "pass", "skip", "manual", "override", "preference")
+DEFAULT_MIX = "read=55,pass=10,skip=5,manual=10,override=10,preference=10"
+CACHE_MODES = ("session", "reload")
+STATE_FILES = [CURRENT_QUEUE_FILE, DAILY_ASSIGNMENTS_FILE, PREFERENCES_FILE, ROTATION_STATE_FILE]
+
+# ---------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------
+def parse_mix(text: str) -> Dict[str, float]:
+    mix: Dict[str, float] = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ACTIONS:
+            raise argparse.ArgumentTypeError(f"unknown action '{name}' (use {', '.join(ACTIONS)})")
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid weight for '{name}': '{weight}'")
+    if sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError("mix weights must add up to more than zero")
+    return mix
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile; 0.0 for an empty list.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def nth_weekday(start: date, n: int) -> date:
+    d = start
+    while not is_weekday(d):
+        d += timedelta(days=1)
+    for _ in range(n):
+        d += timedelta(days=1)
+        while not is_weekday(d):
+            d += timedelta(days=1)
+    return d
+
+# ---------------------------------------------------------------------
+# Worker process: one AppTest per simulated session
+# ---------------------------------------------------------------------
+def _instrument_writes(log: List[Tuple[str, float, float, bool]],
+                       offsets: List[Tuple[float, int]]) -> None:
+    """
+    Wrap the JSON writers so every file write is recorded as (path, start, end, ok),
+    and every successful rotation_state.json write as (end, offset written).
+    Wall-clock times are used so intervals from different workers can be compared.
+    """
+    import pequitopah_core
+    import batch_edit
+
+    orig_one = pequitopah_core.safe_save_json
+    orig_many = batch_edit.safe_save_json_many
+
+    def timed_save_json(path: str, data: Any) -> None:
+        t0 = time.time()
+        try:
+            orig_one(path, data)
+        except Exception:
+            log.append((path, t0, time.time(), False))
+            raise
+        t1 = time.time()
+        log.append((path, t0, t1, True))
+        if path == ROTATION_STATE_FILE:
+            offsets.append((t1, int(data["offset"])))
+
+    def timed_save_json_many(items: Dict[str, Any]) -> None:
+        t0 = time.time()
+        ok = False
+        try:
+            orig_many(items)
+            ok = True
+        finally:
+            t1 = time.time()
+            for path in items:
+                log.append((path, t0, t1, ok))
+            if ok and ROTATION_STATE_FILE in items:
+                offsets.append((t1, int(items[ROTATION_STATE_FILE]["offset"])))
+
+    pequitopah_core.safe_save_json = timed_save_json
+    batch_edit.safe_save_json_many = timed_save_json_many
+
+def _click(at, label: str, exact: bool = False):
+    for b in at.button:
+        if b.label == label or (not exact and b.label.startswith(label)):
+            return b
+    return None
+
+def _today_key() -> str:
+    # same date the Agenda controls act on
+    return get_next_weekday(datetime.now().date()).strftime("%Y-%m-%d")
+
+def _worker(job: Dict[str, Any]) -> Dict[str, Any]:
+    os.chdir(job["state_dir"])
+    os.environ["PEQUITOPAH_STATE_CACHE"] = job["cache"]
+    from streamlit.testing.v1 import AppTest
+    if not job["verbose"]:
+        # AppTest re-applies Streamlit's logger config on every run; errors are read from at.exception
+        logging.disable(logging.CRITICAL)
+
+    writes: List[Tuple[str, float, float, bool]] = []
+    offsets: List[Tuple[float, int]] = []
+    _instrument_writes(writes, offsets)
+
+    rng = random.Random(job["seed"])
+    names = list(job["mix"].keys())
+    weights = list(job["mix"].values())
+    reruns: List[Tuple[str, float, bool]] = []
+    errors: List[str] = []
+    overrides: List[Tuple[str, str]] = []
+    prefs: List[Tuple[float, str, List[int]]] = []
+    rotation: List[Tuple[float, int, int]] = []
+    today: List[Tuple[float, Optional[str]]] = []  # writes touching today's key: (end, value or None)
+
+    def write_end(path: str, since: int) -> Optional[float]:
+        """
+        End time of the last successful write to path logged after index 'since'.
+        """
+        ends = [w[2] for w in writes[since:] if w[0] == path and w[3]]
+        return ends[-1] if ends else None
+
+    def timed_run(kind: str, fn) -> Optional[Any]:
+        t0 = time.perf_counter()
+        try:
+            at = fn()
+        except Exception as e:  # harness-level failure (e.g. timeout)
+            reruns.append((kind, time.perf_counter() - t0, False))
+            errors.append(f"{kind}: {type(e).__name__}: {e}")
+            return None
+        ok = not at.exception
+        reruns.append((kind, time.perf_counter() - t0, ok))
+        if not ok:
+            errors.extend(f"{kind}: {x.message}" for x in at.exception)
+        return at if ok else None
+
+    while time.time() < job["start_at"]:
+        time.sleep(0.005)
+
+    sessions = {}
+    for sid in job["session_ids"]:
+        at = AppTest.from_file(APP_PATH, default_timeout=job["timeout"])
+        timed_run("open", at.run)
+        sessions[sid] = at
+
+    for step in range(job["actions"]):
+        for sid, at in sessions.items():
+            kind = rng.choices(names, weights)[0]
+            if kind == "read":
+                timed_run(kind, at.run)
+            elif kind in ("pass", "skip"):
+                btn = _click(at, "⏭" if kind == "pass" else "🚫")
+                if btn is not None:
+                    mark, wmark = len(offsets), len(writes)
+                    if timed_run(kind, btn.click().run) is not None:
+                        if len(offsets) > mark:
+                            t1, value = offsets[-1]
+                            rotation.append((t1, value, 1 if kind == "pass" else -1))
+                        # pass clears today's manual choice, skip sets it to "Ninguém"
+                        t1 = write_end(DAILY_ASSIGNMENTS_FILE, wmark)
+                        if t1 is not None:
+                            today.append((t1, None if kind == "pass" else "Ninguém"))
+            elif kind == "manual":
+                person = rng.choice(ORIGINAL_QUEUE)
+                btn = _click(at, "✓", exact=True)
+                if btn is None:
+                    continue
+                mark = len(writes)
+                if timed_run(kind, at.selectbox(key="manual_select").set_value(person).run) is None:
+                    continue
+                if timed_run(kind, _click(at, "✓", exact=True).click().run) is not None:
+                    # the app only saves when the choice differs from today's person
+                    t1 = write_end(DAILY_ASSIGNMENTS_FILE, mark)
+                    if t1 is not None:
+                        today.append((t1, person))
+            elif kind == "override":
+                d = nth_weekday(job["override_base"], sid * job["actions"] + step).strftime("%Y-%m-%d")
+                person = rng.choice(ORIGINAL_QUEUE)
+                if timed_run(kind, at.text_area(key="batch_text").input(
+                        f"op,date,person,avoid,position\noverride,{d},{person},,\n").run) is None:
+                    continue
+                btn = _click(at, "✔")
+                if btn is not None and not btn.disabled and timed_run(kind, btn.click().run) is not None:
+                    overrides.append((d, person))
+            elif kind == "preference":
+                person = rng.choice(ORIGINAL_QUEUE)
+                days = sorted(rng.sample(range(5), rng.randint(0, 2)))
+                avoid = ";".join(DAY_NAMES_PT_SHORT[x] for x in days)
+                if timed_run(kind, at.text_area(key="batch_text").input(
+                        f"op,date,person,avoid,position\npreference,,{person},{avoid},\n").run) is None:
+                    continue
+                btn = _click(at, "✔")
+                if btn is None or btn.disabled:
+                    continue  # no change from this session's view of the state
+                mark = len(writes)
+                if timed_run(kind, btn.click().run) is not None:
+                    # order by when the file was written, not when the rerun finished
+                    t1 = write_end(PREFERENCES_FILE, mark)
+                    if t1 is not None:
+                        prefs.append((t1, person, days))
+            if job["think_ms"]:
+                time.sleep(rng.uniform(0, job["think_ms"]) / 1000.0)
+
+    return {"reruns": reruns, "errors": errors, "writes": writes, "overrides": overrides, "prefs": prefs,
+            "rotation": rotation, "today": today}
+
+# ---------------------------------------------------------------------
+# Aggregation
+# ---------------------------------------------------------------------
+def write_contention(writes: List[Tuple[str, float, float, bool]]) -> Dict[str, Any]:
+    """
+    Per file: number of writes, writes overlapping another write on the same file,
+    the peak number of simultaneous writers, and failed writes.
+    """
+    out: Dict[str, Any] = {}
+    for path in sorted({w[0] for w in writes}):
+        spans = sorted((w[1], w[2], w[3]) for w in writes if w[0] == path)
+        overlapping = set()
+        peak, events = 0, []
+        for i, (s, e, _) in enumerate(spans):
+            events.append((s, 1))
+            events.append((e, -1))
+            for j in range(i + 1, len(spans)):
+                if spans[j][0] >= e:
+                    break
+                overlapping.update((i, j))
+        cur = 0
+        for _, delta in sorted(events, key=lambda x: (x[0], x[1])):
+            cur += delta
+            peak = max(peak, cur)
+        out[path] = {
+            "writes": len(spans),
+            "overlapping": len(overlapping),
+            "max_concurrent": peak,
+            "failed": sum(1 for s in spans if not s[2]),
+        }
+    return out
+
+def lost_updates(state_dir: str, overrides: List[Tuple[str, str]],
+                 prefs: List[Tuple[float, str, List[int]]],
+                 rotation: List[Tuple[float, int, int]],
+                 today: List[Tuple[float, Optional[str]]], today_key: str,
+                 initial_offset: int, queue_len: int) -> Dict[str, Any]:
+    """
+    Compare what sessions successfully saved with what is on disk at the end.
+    - override dates are unique per action, so every saved override should survive,
+    - for preferences only the last write per person is expected to survive,
+    - today's manual choice (✓, cleared by pass, "Ninguém" by skip) must match its last write,
+    - pass (+1) / skip (-1) writes are replayed in write order: a write that is not the
+      previous offset plus its own step was computed from a stale offset and lost updates.
+    """
+    final_assign = _read_json(os.path.join(state_dir, DAILY_ASSIGNMENTS_FILE)) or {}
+    final_prefs = _read_json(os.path.join(state_dir, PREFERENCES_FILE)) or {}
+    lost_ovr = sum(1 for d, p in overrides if final_assign.get(d) != p)
+
+    last: Dict[str, List[int]] = {}
+    for _, person, days in sorted(prefs, key=lambda x: x[0]):
+        last[person] = days
+    lost_pref = sum(1 for person, days in last.items() if sorted(final_prefs.get(person, [])) != days)
+
+    today_expected = max(today, key=lambda x: x[0])[1] if today else None
+    today_final = final_assign.get(today_key)
+    lost_today = 1 if today and today_final != today_expected else 0
+
+    lost_rot = 0
+    expected = initial_offset
+    prev = initial_offset
+    for _, value, delta in sorted(rotation, key=lambda x: x[0]):
+        expected = (expected + delta) % queue_len
+        if value != (prev + delta) % queue_len:
+            lost_rot += 1
+        prev = value
+    final_state = _read_json(os.path.join(state_dir, ROTATION_STATE_FILE)) or {}
+
+    corrupt = [f for f in STATE_FILES
+               if os.path.exists(os.path.join(state_dir, f)) and _read_json(os.path.join(state_dir, f)) is None]
+    leftovers = [f for f in os.listdir(state_dir) if f.endswith(".tmp")]
+    return {
+        "overrides_saved": len(overrides),
+        "overrides_lost": lost_ovr,
+        "preferences_checked": len(last),
+        "preferences_lost": lost_pref,
+        "today_writes": len(today),
+        "today_lost": lost_today,
+        "today_expected": today_expected,
+        "today_final": today_final,
+        "rotation_saved": len(rotation),
+        "rotation_lost": lost_rot,
+        "rotation_expected_offset": expected,
+        "rotation_final_offset": final_state.get("offset"),
+        "corrupt_files": corrupt,
+        "leftover_tmp_files": leftovers,
+    }
+
+def _read_json(path: str) -> Any:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+# ---------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------
+def run_config(args: argparse.Namespace, cache: str, storage: str) -> Dict[str, Any]:
+    state_dir = tempfile.mkdtemp(prefix="pequitopah-load-", dir=storage)
+    try:
+        # Start from a copy of the app's current state so the run resembles production
+        for f in STATE_FILES:
+            if os.path.exists(os.path.join(APP_DIR, f)):
+                shutil.copy(os.path.join(APP_DIR, f), os.path.join(state_dir, f))
+        queue = _read_json(os.path.join(state_dir, CURRENT_QUEUE_FILE)) or ORIGINAL_QUEUE
+        initial_state = _read_json(os.path.join(state_dir, ROTATION_STATE_FILE)) or {}
+        initial_offset = initial_state.get("offset", anchor_offset_for(queue))
+        workers = max(1, min(args.workers, args.sessions))
+        slices = [list(range(args.sessions))[i::workers] for i in range(workers)]
+        start_at = time.time() + args.warmup
+        jobs = [{
+            "state_dir": state_dir,
+            "cache": cache,
+            "session_ids": ids,
+            "actions": args.actions,
+            "mix": args.mix,
+            "seed": args.seed * 1000 + w,
+            "think_ms": args.think_ms,
+            "timeout": args.timeout,
+            "start_at": start_at,
+            "override_base": date.today() + timedelta(days=60),
+            "verbose": args.verbose,
+        } for w, ids in enumerate(slices)]
+
+        ctx = mp.get_context("spawn")
+        with ctx.Pool(workers) as pool:
+            results = pool.map(_worker, jobs)
+        wall = time.time() - start_at
+        today_key = _today_key()
+
+        reruns = [r for res in results for r in res["reruns"]]
+        # "open" carries per-process warm-up; it is only reported in by_action
+        latencies = [r[1] for r in reruns if r[0] != "open"]
+        by_action: Dict[str, Dict[str, float]] = {}
+        for kind in ("open",) + ACTIONS:
+            lat = [r[1] for r in reruns if r[0] == kind]
+            if lat:
+                by_action[kind] = {"count": len(lat), "p50_ms": percentile(lat, 50) * 1000,
+                                   "p99_ms": percentile(lat, 99) * 1000}
+        errors = [e for res in results for e in res["errors"]]
+        report = {
+            "cache": cache,
+            "storage": storage,
+            "state_dir": state_dir if args.keep_state else None,
+            "sessions": args.sessions,
+            "workers": workers,
+            "reruns": len(reruns),
+            "rerun_errors": sum(1 for r in reruns if not r[2]),
+            "wall_s": wall,
+            "throughput_rps": len(reruns) / wall if wall > 0 else 0.0,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "by_action": by_action,
+            "writes": write_contention([w for res in results for w in res["writes"]]),
+            "lost": lost_updates(state_dir,
+                                 [o for res in results for o in res["overrides"]],
+                                 [p for res in results for p in res["prefs"]],
+                                 [r for res in results for r in res["rotation"]],
+                                 [t for res in results for t in res["today"]], today_key,
+                                 initial_offset, len(queue)),
+            "error_samples": sorted(set(errors))[:10],
+        }
+        return report
+    finally:
+        # also on worker crashes / Ctrl-C
+        if not args.keep_state:
+            shutil.rmtree(state_dir, ignore_errors=True)
+
+def print_report(report: Dict[str, Any]) -> None:
+    lost = report["lost"]
+    print(f"\n== cache={report['cache']} storage={report['storage']} "
+          f"({report['sessions']} sessions / {report['workers']} workers)")
+    if report["state_dir"]:
+        print(f"state kept in {report['state_dir']}")
+    print(f"reruns {report['reruns']} in {report['wall_s']:.1f}s -> {report['throughput_rps']:.1f}/s | "
+          f"p50 {report['p50_ms']:.0f} ms  p99 {report['p99_ms']:.0f} ms | errors {report['rerun_errors']}")
+    for kind, s in report["by_action"].items():
+        print(f"  {kind:<11} n={s['count']:<5} p50 {s['p50_ms']:7.0f} ms  p99 {s['p99_ms']:7.0f} ms")
+    print("writes:")
+    for path, w in report["writes"].items():
+        print(f"  {path:<24} {w['writes']:>5} writes  {w['overlapping']:>4} overlapping  "
+              f"max {w['max_concurrent']} concurrent  {w['failed']} failed")
+    print(f"lost updates: overrides {lost['overrides_lost']}/{lost['overrides_saved']}, "
+          f"preferences {lost['preferences_lost']}/{lost['preferences_checked']}, "
+          f"today's manual choice {lost['today_lost']}/{1 if lost['today_writes'] else 0} "
+          f"(expected {lost['today_expected']}, final {lost['today_final']}), "
+          f"rotation {lost['rotation_lost']}/{lost['rotation_saved']} "
+          f"(offset expected {lost['rotation_expected_offset']}, final {lost['rotation_final_offset']})"
+          + (f", corrupt files {lost['corrupt_files']}" if lost["corrupt_files"] else "")
+          + (f", leftover tmp {lost['leftover_tmp_files']}" if lost["leftover_tmp_files"] else ""))
+    for e in report["error_samples"]:
+        print(f"  ! {e}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Multi-session load test for streamlit_app.py (local state only).")
+    parser.add_argument("--sessions", type=int, default=50, help="simulated browser sessions (default: 50)")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent worker processes (default: 8)")
+    parser.add_argument("--actions", type=int, default=10, help="actions per session after opening (default: 10)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"action weights (default: {DEFAULT_MIX}); preferences are only "
+                             "written through the Lote tab, the 💾 grid cannot be driven by AppTest")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="max random pause between actions")
+    parser.add_argument("--cache", nargs="+", choices=CACHE_MODES, default=["session"],
+                        help="PEQUITOPAH_STATE_CACHE modes to compare")
+    parser.add_argument("--storage", nargs="+", default=[tempfile.gettempdir()],
+                        help="directories to hold the scratch state (e.g. /tmp /dev/shm)")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds for workers to start before the burst")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-rerun AppTest timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_out", help="also write all reports to this JSON file")
+    parser.add_argument("--keep-state", action="store_true", help="keep each run's scratch state directory")
+    parser.add_argument("--verbose", action="store_true", help="keep Streamlit's own logging")
+    args = parser.parse_args(argv)
+
+    reports = []
+    for cache, storage in itertools.product(args.cache, args.storage):
+        report = run_config(args, cache, storage)
+        print_report(report)
+        reports.append(report)
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+"""
+Core rotation logic and JSON persistence for Pequitopah.
+
+Kept free of Streamlit so the app, the batch CLI and scripts can share it.
+"""
+from datetime import timedelta, date
+import json
+import os
+import tempfile
+import threading
+from typing import List, Dict, Any, Tuple, Optional
+
+# ---------------------------------------------------------------------
+# Constants and configuration
+# ---------------------------------------------------------------------
+ORIGINAL_QUEUE: List[str] = ["Pavel", "Guilherme", "Victor", "Chris", "Alan", "Thiago", "Clayton", "Carolina"]
+
+# Anchor: start rotation on 09/10/2025 with Pavel
+ANCHOR_DATE: date = date(2025, 10, 9)
+ANCHOR_PERSON: str = "Pavel"
+
+# Files for persistence
+CURRENT_QUEUE_FILE = "current_queue.json"
+DAILY_ASSIGNMENTS_FILE = "daily_assignments.json"
+PREFERENCES_FILE = "preferences.json"
+ROTATION_STATE_FILE = "rotation_state.json"  # stores {anchor_date, anchor_person, offset}
+
+# Day labels (Portuguese, weekdays only)
+DAY_NAMES_PT = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta"]
+DAY_NAMES_PT_SHORT = ["Seg", "Ter", "Qua", "Qui", "Sex"]
+
+# Serializes safe_save_json_many within one process (Streamlit sessions are threads)
+_SAVE_MANY_LOCK = threading.Lock()
+
+# ---------------------------------------------------------------------
+# Safe JSON helpers
+# ---------------------------------------------------------------------
+def safe_load_json(path: str, default: Any) -> Any:
+    try:
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+    except Exception:
+        pass
+    return default
+
+def safe_save_json(path: str, data: Any) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+def safe_save_json_many(items: Dict[str, Any]) -> None:
+    """
+    Persist several files as one commit: every payload is serialized to its own
+    temp file first, and only then are the files swapped in. A failure while
+    serializing leaves all targets untouched. Batches from concurrent sessions
+    (threads of the same server) are serialized by a lock.
+    """
+    with _SAVE_MANY_LOCK:
+        staged: List[Tuple[str, str]] = []
+        try:
+            for path, data in items.items():
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".")
+                staged.append((tmp, path))
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+            while staged:
+                tmp, path = staged[0]
+                os.replace(tmp, path)
+                staged.pop(0)
+        finally:
+            # only our own temp files: anything still staged was not swapped in
+            for tmp, _ in staged:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+
+# ---------------------------------------------------------------------
+# Persistence: queue, assignments, preferences, rotation state
+# ---------------------------------------------------------------------
+def load_current_queue() -> List[str]:
+    data = safe_load_json(CURRENT_QUEUE_FILE, None)
+    if isinstance(data, list) and data and all(isinstance(x, str) for x in data):
+        return data
+    return ORIGINAL_QUEUE.copy()
+
+def save_current_queue(queue: List[str]) -> None:
+    safe_save_json(CURRENT_QUEUE_FILE, queue)
+
+def load_daily_assignments() -> Dict[str, str]:
+    data = safe_load_json(DAILY_ASSIGNMENTS_FILE, {})
+    if isinstance(data, dict):
+        return {k: v for k, v in data.items() if isinstance(k, str) and isinstance(v, str)}
+    return {}
+
+def save_daily_assignments(data: Dict[str, str]) -> None:
+    safe_save_json(DAILY_ASSIGNMENTS_FILE, data)
+
+def load_preferences() -> Dict[str, List[int]]:
+    # Dynamic: accept any names, sanitize values 0..4 (weekdays)
+    data = safe_load_json(PREFERENCES_FILE, {})
+    if not isinstance(data, dict):
+        return {}
+    cleaned: Dict[str, List[int]] = {}
+    for k, v in data.items():
+        if isinstance(k, str) and isinstance(v, list):
+            cleaned[k] = [x for x in v if isinstance(x, int) and 0 <= x <= 4]
+    return cleaned
+
+def save_preferences(prefs: Dict[str, List[int]]) -> None:
+    safe_save_json(PREFERENCES_FILE, prefs)
+
+def load_rotation_state(current_queue: List[str]) -> int:
+    """
+    rotation_offset aligns positions so that index 'rotation_offset' in the current_queue
+    is the person assigned on ANCHOR_DATE, and persists with anchor metadata.
+    """
+    want_anchor_date = ANCHOR_DATE.strftime("%Y-%m-%d")
+    state = safe_load_json(ROTATION_STATE_FILE, None)
+    if isinstance(state, dict) and "offset" in state:
+        if state.get("anchor_date") == want_anchor_date and state.get("anchor_person") == ANCHOR_PERSON:
+            try:
+                return int(state["offset"])
+            except Exception:
+                pass
+    # Initialize offset so ANCHOR_PERSON is assigned on ANCHOR_DATE
+    idx = anchor_offset_for(current_queue)
+    save_rotation_state(idx)
+    return idx
+
+def rotation_state_payload(offset: int) -> Dict[str, Any]:
+    return {
+        "anchor_date": ANCHOR_DATE.strftime("%Y-%m-%d"),
+        "anchor_person": ANCHOR_PERSON,
+        "offset": int(offset)
+    }
+
+def save_rotation_state(offset: int) -> None:
+    safe_save_json(ROTATION_STATE_FILE, rotation_state_payload(offset))
+
+# ---------------------------------------------------------------------
+# Date utilities
+# ---------------------------------------------------------------------
+def is_weekday(d: date) -> bool:
+    return d.weekday() < 5
+
+def get_next_weekday(d: date) -> date:
+    while not is_weekday(d):
+        d += timedelta(days=1)
+    return d
+
+def count_weekdays_between(start_d: date, end_d: date) -> int:
+    """
+    Inclusive count of weekdays between two dates.
+    """
+    if end_d < start_d:
+        return 0
+    cnt = 0
+    cur = start_d
+    while cur <= end_d:
+        if is_weekday(cur):
+            cnt += 1
+        cur += timedelta(days=1)
+    return cnt
+
+# ---------------------------------------------------------------------
+# Rotation math
+# ---------------------------------------------------------------------
+def weekdays_since_anchor(d: date) -> int:
+    d = get_next_weekday(d)
+    return max(0, count_weekdays_between(ANCHOR_DATE, d) - 1)  # 0 at anchor
+
+def position_for_date(d: date, queue: List[str], rotation_offset: int) -> int:
+    w = weekdays_since_anchor(d)
+    return (rotation_offset + w) % len(queue)
+
+def cycle_index_for_date(d: date, queue_len: int, rotation_offset: int) -> int:
+    w = weekdays_since_anchor(d)
+    return (rotation_offset + w) // queue_len
+
+# ---------------------------------------------------------------------
+# Selection (single-day, used for some controls)
+# ---------------------------------------------------------------------
+def select_person_for_date(
+    target_date: date,
+    current_queue: List[str],
+    daily_assignments: Dict[str, str],
+    preferences: Dict[str, List[int]],
+    rotation_offset: int
+) -> str:
+    td = get_next_weekday(target_date)
+    ds = td.strftime("%Y-%m-%d")
+
+    if ds in daily_assignments:
+        return daily_assignments[ds]
+
+    n = len(current_queue)
+    base = position_for_date(td, current_queue, rotation_offset)
+
+    # Respect preferences
+    for i in range(n):
+        cand = current_queue[(base + i) % n]
+        if td.weekday() in preferences.get(cand, []):
+            continue
+        return cand
+
+    return current_queue[base]
+
+# ---------------------------------------------------------------------
+# Simulation with preference "swap" carryover
+# ---------------------------------------------------------------------
+def simulate_schedule(
+    start_date: date,
+    days: int,
+    current_queue: List[str],
+    daily_assignments: Dict[str, str],
+    preferences: Dict[str, List[int]],
+    rotation_offset: int
+) -> List[Tuple[date, str]]:
+    """
+    Build a day-by-day schedule applying:
+    - manual overrides,
+    - if base person avoids the weekday, assign next eligible and carry the avoided base person to the next weekday (swap),
+    - the carryover is attempted only on the immediate next weekday; if they also avoid it, the carry is dropped.
+    """
+    out: List[Tuple[date, str]] = []
+    carry_person: Optional[str] = None
+    cur = get_next_weekday(start_date)
+    for _ in range(days):
+        ds = cur.strftime("%Y-%m-%d")
+
+        # Manual override: takes precedence and clears any carryover
+        if ds in daily_assignments:
+            out.append((cur, daily_assignments[ds]))
+            carry_person = None
+            cur = get_next_weekday(cur + timedelta(days=1))
+            continue
+
+        # If there is a carryover, try to place them today unless they avoid today
+        if carry_person is not None and cur.weekday() not in preferences.get(carry_person, []):
+            out.append((cur, carry_person))
+            carry_person = None
+            cur = get_next_weekday(cur + timedelta(days=1))
+            continue
+        else:
+            # drop carryover if cannot place today
+            carry_person = None
+
+        # Normal selection from base
+        n = len(current_queue)
+        base = position_for_date(cur, current_queue, rotation_offset)
+        base_person = current_queue[base]
+
+        # If base avoids, find next eligible and carry base to next day
+        if cur.weekday() in preferences.get(base_person, []):
+            assigned = None
+            for i in range(1, n + 1):  # search next eligible including wrap
+                cand = current_queue[(base + i) % n]
+                if cur.weekday() in preferences.get(cand, []):
+                    continue
+                assigned = cand
+                break
+            if assigned is None:
+                assigned = base_person  # fallback
+            else:
+                # set carry to place base_person tomorrow (single-day swap)
+                carry_person = base_person
+            out.append((cur, assigned))
+        else:
+            out.append((cur, base_person))
+
+        cur = get_next_weekday(cur + timedelta(days=1))
+
+    return out
+
+# ---------------------------------------------------------------------
+# Queue change helpers
+# ---------------------------------------------------------------------
+def anchor_offset_for(queue: List[str]) -> int:
+    """
+    Offset that puts ANCHOR_PERSON on ANCHOR_DATE for this queue order (0 if absent).
+    """
+    try:
+        return queue.index(ANCHOR_PERSON)
+    except ValueError:
+        return 0
+
+def move_person(queue: List[str], person: str, new_index: int) -> List[str]:
+    if person not in queue:
+        return queue
+    q = queue.copy()
+    old_index = q.index(person)
+    q.pop(old_index)
+    new_index = max(0, min(new_index, len(q)))  # clamp to ends
+    q.insert(new_index, person)
+    return q
+
@@ -1,9 +1,23 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta, date
-import json
+from datetime import datetime, timedelta
 import os
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict
+from pequitopah_core import (
+    ORIGINAL_QUEUE,
+    CURRENT_QUEUE_FILE, DAILY_ASSIGNMENTS_FILE, PREFERENCES_FILE, ROTATION_STATE_FILE,
+    DAY_NAMES_PT, DAY_NAMES_PT_SHORT,
+    load_current_queue, save_current_queue,
+    load_daily_assignments, save_daily_assignments,
+    load_preferences, save_preferences,
+    load_rotation_state, save_rotation_state,
+    get_next_weekday, count_weekdays_between, cycle_index_for_date,
+    select_person_for_date, simulate_schedule,
+    anchor_offset_for, move_person,
+)
+from batch_edit import (
+    BATCH_COLUMNS, BatchError, decode_batch_bytes, parse_batch, apply_batch, save_batch_result,
+)
 
 # ---------------------------------------------------------------------
 # Page config
@@ -62,242 +76,6 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-# ---------------------------------------------------------------------
-# Constants and configuration
-# ---------------------------------------------------------------------
-ORIGINAL_QUEUE: List[str] = ["Pavel", "Guilherme", "Victor", "Chris", "Alan", "Thiago", "Clayton", "Carolina"]
-
-# Anchor: start rotation on 09/10/2025 with Pavel
-ANCHOR_DATE: date = date(2025, 10, 9)
-ANCHOR_PERSON: str = "Pavel"
-
-# Files for persistence
-CURRENT_QUEUE_FILE = "current_queue.json"
-DAILY_ASSIGNMENTS_FILE = "daily_assignments.json"
-PREFERENCES_FILE = "preferences.json"
-ROTATION_STATE_FILE = "rotation_state.json"  # stores {anchor_date, anchor_person, offset}
-
-# Day labels (Portuguese, weekdays only)
-DAY_NAMES_PT = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta"]
-DAY_NAMES_PT_SHORT = ["Seg", "Ter", "Qua", "Qui", "Sex"]
-
-# ---------------------------------------------------------------------
-# Safe JSON helpers
-# ---------------------------------------------------------------------
-def safe_load_json(path: str, default: Any) -> Any:
-    try:
-        if os.path.exists(path):
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
-    except Exception:
-        pass
-    return default
-
-def safe_save_json(path: str, data: Any) -> None:
-    tmp = path + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, path)
-
-# ---------------------------------------------------------------------
-# Persistence: queue, assignments, preferences, rotation state
-# ---------------------------------------------------------------------
-def load_current_queue() -> List[str]:
-    data = safe_load_json(CURRENT_QUEUE_FILE, None)
-    if isinstance(data, list) and data and all(isinstance(x, str) for x in data):
-        return data
-    return ORIGINAL_QUEUE.copy()
-
-def save_current_queue(queue: List[str]) -> None:
-    safe_save_json(CURRENT_QUEUE_FILE, queue)
-
-def load_daily_assignments() -> Dict[str, str]:
-    data = safe_load_json(DAILY_ASSIGNMENTS_FILE, {})
-    if isinstance(data, dict):
-        return {k: v for k, v in data.items() if isinstance(k, str) and isinstance(v, str)}
-    return {}
-
-def save_daily_assignments(data: Dict[str, str]) -> None:
-    safe_save_json(DAILY_ASSIGNMENTS_FILE, data)
-
-def load_preferences() -> Dict[str, List[int]]:
-    # Dynamic: accept any names, sanitize values 0..4 (weekdays)
-    data = safe_load_json(PREFERENCES_FILE, {})
-    if not isinstance(data, dict):
-        return {}
-    cleaned: Dict[str, List[int]] = {}
-    for k, v in data.items():
-        if isinstance(k, str) and isinstance(v, list):
-            cleaned[k] = [x for x in v if isinstance(x, int) and 0 <= x <= 4]
-    return cleaned
-
-def save_preferences(prefs: Dict[str, List[int]]) -> None:
-    safe_save_json(PREFERENCES_FILE, prefs)
-
-def load_rotation_state(current_queue: List[str]) -> int:
-    """
-    rotation_offset aligns positions so that index 'rotation_offset' in the current_queue
-    is the person assigned on ANCHOR_DATE, and persists with anchor metadata.
-    """
-    want_anchor_date = ANCHOR_DATE.strftime("%Y-%m-%d")
-    state = safe_load_json(ROTATION_STATE_FILE, None)
-    if isinstance(state, dict) and "offset" in state:
-        if state.get("anchor_date") == want_anchor_date and state.get("anchor_person") == ANCHOR_PERSON:
-            try:
-                return int(state["offset"])
-            except Exception:
-                pass
-    # Initialize offset so ANCHOR_PERSON is assigned on ANCHOR_DATE
-    try:
-        idx = current_queue.index(ANCHOR_PERSON)
-    except ValueError:
-        idx = 0
-    save_rotation_state(idx)
-    return idx
-
-def save_rotation_state(offset: int) -> None:
-    state = {
-        "anchor_date": ANCHOR_DATE.strftime("%Y-%m-%d"),
-        "anchor_person": ANCHOR_PERSON,
-        "offset": int(offset)
-    }
-    safe_save_json(ROTATION_STATE_FILE, state)
-
-# ---------------------------------------------------------------------
-# Date utilities
-# ---------------------------------------------------------------------
-def is_weekday(d: date) -> bool:
-    return d.weekday() < 5
-
-def get_next_weekday(d: date) -> date:
-    while not is_weekday(d):
-        d += timedelta(days=1)
-    return d
-
-def count_weekdays_between(start_d: date, end_d: date) -> int:
-    """
-    Inclusive count of weekdays between two dates.
-    """
-    if end_d < start_d:
-        return 0
-    cnt = 0
-    cur = start_d
-    while cur <= end_d:
-        if is_weekday(cur):
-            cnt += 1
-        cur += timedelta(days=1)
-    return cnt
-
-# ---------------------------------------------------------------------
-# Rotation math
-# ---------------------------------------------------------------------
-def weekdays_since_anchor(d: date) -> int:
-    d = get_next_weekday(d)
-    return max(0, count_weekdays_between(ANCHOR_DATE, d) - 1)  # 0 at anchor
-
-def position_for_date(d: date, queue: List[str], rotation_offset: int) -> int:
-    w = weekdays_since_anchor(d)
-    return (rotation_offset + w) % len(queue)
-
-def cycle_index_for_date(d: date, queue_len: int, rotation_offset: int) -> int:
-    w = weekdays_since_anchor(d)
-    return (rotation_offset + w) // queue_len
-
-# ---------------------------------------------------------------------
-# Selection (single-day, used for some controls)
-# ---------------------------------------------------------------------
-def select_person_for_date(
-    target_date: date,
-    current_queue: List[str],
-    daily_assignments: Dict[str, str],
-    preferences: Dict[str, List[int]],
-    rotation_offset: int
-) -> str:
-    td = get_next_weekday(target_date)
-    ds = td.strftime("%Y-%m-%d")
-
-    if ds in daily_assignments:
-        return daily_assignments[ds]
-
-    n = len(current_queue)
-    base = position_for_date(td, current_queue, rotation_offset)
-
-    # Respect preferences
-    for i in range(n):
-        cand = current_queue[(base + i) % n]
-        if td.weekday() in preferences.get(cand, []):
-            continue
-        return cand
-
-    return current_queue[base]
-
-# ---------------------------------------------------------------------
-# Simulation with preference "swap" carryover
-# ---------------------------------------------------------------------
-def simulate_schedule(
-    start_date: date,
-    days: int,
-    current_queue: List[str],
-    daily_assignments: Dict[str, str],
-    preferences: Dict[str, List[int]],
-    rotation_offset: int
-) -> List[Tuple[date, str]]:
-    """
-    Build a day-by-day schedule applying:
-    - manual overrides,
-    - if base person avoids the weekday, assign next eligible and carry the avoided base person to the next weekday (swap),
-    - the carryover is attempted only on the immediate next weekday; if they also avoid it, the carry is dropped.
-    """
-    out: List[Tuple[date, str]] = []
-    carry_person: Optional[str] = None
-    cur = get_next_weekday(start_date)
-    for _ in range(days):
-        ds = cur.strftime("%Y-%m-%d")
-
-        # Manual override: takes precedence and clears any carryover
-        if ds in daily_assignments:
-            out.append((cur, daily_assignments[ds]))
-            carry_person = None
-            cur = get_next_weekday(cur + timedelta(days=1))
-            continue
-
-        # If there is a carryover, try to place them today unless they avoid today
-        if carry_person is not None and cur.weekday() not in preferences.get(carry_person, []):
-            out.append((cur, carry_person))
-            carry_person = None
-            cur = get_next_weekday(cur + timedelta(days=1))
-            continue
-        else:
-            # drop carryover if cannot place today
-            carry_person = None
-
-        # Normal selection from base
-        n = len(current_queue)
-        base = position_for_date(cur, current_queue, rotation_offset)
-        base_person = current_queue[base]
-
-        # If base avoids, find next eligible and carry base to next day
-        if cur.weekday() in preferences.get(base_person, []):
-            assigned = None
-            for i in range(1, n + 1):  # search next eligible including wrap
-                cand = current_queue[(base + i) % n]
-                if cur.weekday() in preferences.get(cand, []):
-                    continue
-                assigned = cand
-                break
-            if assigned is None:
-                assigned = base_person  # fallback
-            else:
-                # set carry to place base_person tomorrow (single-day swap)
-                carry_person = base_person
-            out.append((cur, assigned))
-        else:
-            out.append((cur, base_person))
-
-        cur = get_next_weekday(cur + timedelta(days=1))
-
-    return out
-
 # ---------------------------------------------------------------------
 # Queue change helpers
 # ---------------------------------------------------------------------
@@ -310,10 +88,7 @@ def apply_queue_change(new_queue: List[str], realign_anchor: bool = True) -> Non
     st.session_state.current_queue = new_queue
     save_current_queue(new_queue)
     if realign_anchor:
-        try:
-            idx = new_queue.index(ANCHOR_PERSON)
-        except ValueError:
-            idx = 0
+        idx = anchor_offset_for(new_queue)
         st.session_state.rotation_offset = idx
         save_rotation_state(idx)
     else:
@@ -321,16 +96,6 @@ def apply_queue_change(new_queue: List[str], realign_anchor: bool = True) -> Non
         save_rotation_state(st.session_state.rotation_offset)
     st.rerun()
 
-def move_person(queue: List[str], person: str, new_index: int) -> List[str]:
-    if person not in queue:
-        return queue
-    q = queue.copy()
-    old_index = q.index(person)
-    q.pop(old_index)
-    new_index = max(0, min(new_index, len(q)))  # clamp to ends
-    q.insert(new_index, person)
-    return q
-
 # ---------------------------------------------------------------------
 # Streamlit App
 # ---------------------------------------------------------------------
@@ -338,6 +103,11 @@ st.title("📅 Pequitopah - Sistema de Almoço")
 st.markdown("---")
 
 # Session state boot
+# PEQUITOPAH_STATE_CACHE: "session" (default) reads the JSON files once per browser session;
+# "reload" re-reads them on every rerun so concurrent sessions see each other's writes.
+if os.environ.get("PEQUITOPAH_STATE_CACHE", "session") == "reload":
+    for key in ("current_queue", "daily_assignments", "preferences", "rotation_offset"):
+        st.session_state.pop(key, None)
 if "current_queue" not in st.session_state:
     st.session_state.current_queue = load_current_queue()
 if "daily_assignments" not in st.session_state:
@@ -539,7 +309,7 @@ with tab_agenda:
 
 with tab_config:
     # Sub-tabs: Preferências first to make it the focus, with an interactive grid
-    pref_tab, fila_tab = st.tabs(["Preferências", "Fila"])
+    pref_tab, fila_tab, batch_tab = st.tabs(["Preferências", "Fila", "Lote"])
 
     with pref_tab:
         st.markdown("#### Preferências por dia (clique para alternar)")
@@ -684,3 +454,38 @@ with tab_config:
 
         st.markdown('</div>', unsafe_allow_html=True)
         st.caption("Mudanças de ordem e nomes realinham a rotação para manter o início em 09/10/2025 com Pavel.")
+
+    with batch_tab:
+        st.markdown("#### Mudanças em lote (CSV/JSON)")
+        st.markdown('<div class="card">', unsafe_allow_html=True)
+        st.caption(f"Colunas: {', '.join(BATCH_COLUMNS)} — op = override | preference | move. "
+                   "Tudo é validado antes e gravado de uma vez.")
+
+        uploaded = st.file_uploader("Arquivo", type=["csv", "json"], label_visibility="collapsed", key="batch_file")
+        if uploaded is not None:
+            batch_source, batch_name = uploaded.getvalue(), uploaded.name
+        else:
+            batch_source = st.text_area("Ou cole aqui", value="", height=140, key="batch_text",
+                                      placeholder="op,date,person,avoid,position\noverride,2025-10-20,Chris,,\nmove,,Alan,,1")
+            batch_name = ""
+
+        if batch_source.strip():
+            try:
+                batch_text = decode_batch_bytes(batch_source) if isinstance(batch_source, bytes) else batch_source
+                batch_changes = parse_batch(batch_text, batch_name)
+                batch_result = apply_batch(batch_changes, current_queue, daily_assignments, preferences, rotation_offset)
+            except BatchError as e:
+                st.error("Lote inválido, nada será gravado:\n\n" + "\n".join(f"- {err}" for err in e.errors))
+            else:
+                st.dataframe(pd.DataFrame(batch_changes).reindex(columns=BATCH_COLUMNS).fillna("").astype(str),
+                             use_container_width=True, hide_index=True)
+                if st.button(f"✔ Aplicar {len(batch_changes)} mudança(s)", use_container_width=True,
+                             disabled=not batch_result["changed"]):
+                    save_batch_result(batch_result)
+                    st.session_state.current_queue = batch_result["current_queue"]
+                    st.session_state.daily_assignments = batch_result["daily_assignments"]
+                    st.session_state.preferences = batch_result["preferences"]
+                    st.session_state.rotation_offset = batch_result["rotation_offset"]
+                    st.rerun()
+
+        st.markdown('</div>', unsafe_allow_html=True)